@@ -1,747 +1,1507 @@
-# -*- coding: utf-8 -*-
-# =================================================================================================
-#   Quality Automation Script (Version 17.4 - Simplified Avg Point Trigger)
-#   Description: This version simplifies the email filter logic. Instead of checking proximity
-#   to the standard point, it now triggers an email for a PASS report if the average
-#   point is above a simple, direct threshold (e.g., >=10), which is configurable
-#   in master.json for full user control.
-# =================================================================================================
-
-import os
-import sys
-import json
-import logging
-import re
-import shutil
-from datetime import datetime
-from pathlib import Path
-from collections import defaultdict
-from typing import List, Dict, Any, Optional, Tuple
-
-# --- Required Library Imports & Error Handling ---
-try:
-    import pandas as pd
-    import openpyxl
-    import xlwings as xw
-    from openpyxl.utils import column_index_from_string, range_boundaries
-    import win32com.client as win32
-    from dotenv import load_dotenv
-except ImportError as e:
-    print(f"\nFATAL: A required library is not found: '{e.name}'.")
-    print("Please run this command in your terminal to install necessary libraries:")
-    print("pip install pandas openpyxl xlwings pywin32 python-dotenv")
-    sys.exit(1)
-
-
-# ==========================================================
-#                      Configuration & Setup
-# ==========================================================
-
-def setup_logging():
-    """Sets up the logging system for both file and console output."""
-    log_file = "automation_log.txt"
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file, mode='w', encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    logging.info(f"Logging system initialized. Log file: {log_file}")
-
-
-class ConfigLoader:
-    """A class to load and access settings from a JSON file."""
-
-    def __init__(self, file_path: str):
-        self.config = self._load_config(file_path)
-
-    def _load_config(self, file_path: str) -> Dict[str, Any]:
-        """Loads configuration from a JSON file."""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            logging.critical(f"❌ FATAL: Configuration file '{file_path}' not found.")
-            sys.exit(1)
-        except json.JSONDecodeError:
-            logging.critical(f"❌ FATAL: JSON syntax error in '{file_path}'.")
-            sys.exit(1)
-
-    def get(self, key: str, default: Any = None) -> Any:
-        """Accesses nested configuration values using dot notation."""
-        keys = key.split('.')
-        value = self.config
-        for k in keys:
-            if isinstance(value, dict) and k in value:
-                value = value[k]
-            else:
-                return default
-        return value
-
-
-# =============================================================================
-#   Helper Functions
-# =============================================================================
-
-def get_excel_files(folder_path: Path) -> List[Path]:
-    """Finds all .xlsx and .xlsm files in a specified folder."""
-    if not folder_path.is_dir():
-        logging.warning(f"Warning: The folder '{folder_path}' does not exist.")
-        return []
-    return list(folder_path.rglob("*.xlsx")) + list(folder_path.rglob("*.xlsm"))
-
-
-def safe_float(value: Any) -> float:
-    """Safely converts a value to a float, returning 0.0 if conversion fails."""
-    if value is None:
-        return 0.0
-    try:
-        return float(value)
-    except (ValueError, TypeError):
-        return 0.0
-
-
-# =============================================================================
-#   TASK 1: Data Entry Handler
-# =============================================================================
-
-class DataEntryHandler:
-    """Handles the data entry task into the main Excel workbook using xlwings to preserve shapes."""
-
-    def __init__(self, config: ConfigLoader):
-        self.config = config
-        self.main_file_path = Path(config.get('paths.main_workbook'))
-        self.backup_dir = Path(config.get('paths.main_workbook_backup'))
-        self.mappings = config.get('mappings_data_entry')
-        self.summary_mapping = self.mappings.get('summary_mapping', {})
-        self.defect_mapping = self.mappings.get('defect_mapping', {})
-        self.table_name = self.mappings.get('target_table_name', 'Table13')
-        self.cell_map = config.get('cell_map_organization')
-
-    def _clear_serial_numbers(self, ws):
-        """Clears the serial number column of the target table before data entry."""
-        try:
-            table_ref = ws.api.ListObjects(self.table_name).Range.Address
-            if not table_ref:
-                logging.warning(f"Table '{self.table_name}' not found. Could not clear serial numbers.")
-                return
-
-            logging.info("Clearing serial number column ('C') of the table...")
-            table_range = ws.range(table_ref)
-            sl_no_column_range = table_range.columns[2].offset(row_offset=1).resize(row_size=table_range.rows.count - 1)
-            sl_no_column_range.clear_contents()
-            logging.info("Serial number column cleared successfully.")
-        except Exception as e:
-            logging.error(f"Error while clearing serial numbers: {e}")
-
-    def _get_sorting_keys_from_file(self, file_path: Path) -> Tuple[str, int, str, int]:
-        """Reads sorting keys from a file according to the rule: Buyer > Consignment > Result > Rolls."""
-        wb = None
-        try:
-            wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-            sheet = wb[self.cell_map['sheet_name']]
-            buyer = str(sheet[self.cell_map['buyer']].value or '').strip()
-            consignment_val = str(sheet[self.cell_map['consignment']].value or '').strip()
-            consignment_num = 0
-            if consignment_val:
-                numeric_part = ''.join(re.findall(r'\d+', consignment_val))
-                if numeric_part:
-                    consignment_num = int(numeric_part)
-            result = str(sheet[self.cell_map['result']].value or '').strip()
-            rolls_val = sheet[self.cell_map['rolls']].value
-            rolls = int(safe_float(rolls_val))
-            return (buyer, consignment_num, result, rolls)
-        except Exception as e:
-            logging.error(f"Error reading sorting key from '{file_path.name}': {e}")
-            return ('', 0, '', 0)
-        finally:
-            if wb:
-                wb.close()
-
-    def _extract_data_for_entry(self, source_path: Path) -> Optional[Dict[str, Any]]:
-        """Extracts data from the source file for entry using openpyxl for speed."""
-        workbook = None
-        try:
-            workbook = openpyxl.load_workbook(filename=source_path, read_only=True, data_only=True)
-            entry_data = {}
-            summary_sheet = workbook["Summary"]
-            for source_cell, target_column in self.summary_mapping.items():
-                entry_data[target_column] = summary_sheet[source_cell].value
-
-            normalized_defect_mapping = {k.lower().strip(): v for k, v in self.defect_mapping.items()}
-            defect_points = {col: 0 for col in self.defect_mapping.values()}
-            unmatched_defect_points = 0
-
-            visible_pages = [s for s in workbook.worksheets if
-                             s.title.startswith("Page ") and s.sheet_state == 'visible']
-            for sheet in visible_pages:
-                for row_num in range(23, 39):
-                    defect_name = str(sheet[f'A{row_num}'].value or '').strip()
-                    if not defect_name: continue
-                    current_row_sum = sum(safe_float(sheet.cell(row=row_num, column=col).value) for col in
-                                          range(column_index_from_string('V'), column_index_from_string('AO') + 1))
-                    target_col = normalized_defect_mapping.get(defect_name.lower())
-                    if target_col:
-                        defect_points[target_col] = defect_points.get(target_col, 0) + current_row_sum
-                    else:
-                        unmatched_defect_points += current_row_sum
-
-            entry_data.update(defect_points)
-            entry_data['AK'] = unmatched_defect_points
-            return entry_data
-        except Exception as e:
-            logging.error(f"  - Error processing file {source_path.name}: {e}")
-            return None
-        finally:
-            if workbook:
-                workbook.close()
-
-    def run(self, source_files_list: List[Path]) -> int:
-        """Executes the data entry process using xlwings to preserve file integrity."""
-        logging.info("=" * 50 + "\nTASK 1: Starting Data Entry into Main Workbook...\n" + "=" * 50)
-        if not source_files_list:
-            logging.warning("No files found for data entry.")
-            return 0
-
-        logging.info("Collecting and sorting data from files...")
-        all_data_to_enter = []
-        for file in source_files_list:
-            logging.info(f"   -> Reading data from: {file.name}")
-            data = self._extract_data_for_entry(file)
-            if data:
-                sort_keys = self._get_sorting_keys_from_file(file)
-                all_data_to_enter.append({'data': data, 'sort_keys': sort_keys, 'file_name': file.name})
-
-        sorted_data = sorted(all_data_to_enter, key=lambda x: x['sort_keys'])
-        logging.info("Data sorted successfully.")
-
-        if not self.main_file_path.is_file():
-            logging.error(f"Main workbook not found at: '{self.main_file_path}'")
-            return 0
-
-        excel_app = None
-        try:
-            excel_app = xw.App(visible=False)
-            target_workbook = excel_app.books.open(self.main_file_path)
-            ws = target_workbook.sheets["Data Analysis report"]
-
-            self._clear_serial_numbers(ws)
-
-            table_ref = ws.api.ListObjects(self.table_name).Range.Address
-            if not table_ref:
-                logging.error(f"Target table '{self.table_name}' not found. Cannot perform data entry.")
-                return 0
-
-            table_range = ws.range(table_ref)
-            invoice_col = table_range.columns[5]  # Column F
-            first_empty_cell = None
-            for cell in invoice_col.offset(row_offset=1).resize(row_size=table_range.rows.count - 1 + 500):
-                if cell.value is None:
-                    first_empty_cell = cell
-                    break
-
-            next_row = first_empty_cell.row if first_empty_cell else ws.cells.last_cell.row + 1
-            if next_row < 181: next_row = 181
-
-            logging.info(f"Data entry will start from row {next_row}.")
-            sl_no_counter = 1
-            for item in sorted_data:
-                entry = item['data']
-                logging.info(f"   -> Writing data for: {item['file_name']}")
-                ws.range(f'C{next_row}').value = sl_no_counter
-                for col_letter, value in entry.items():
-                    try:
-                        ws.range(f'{col_letter}{next_row}').value = value
-                    except Exception as cell_error:
-                        logging.warning(f"Could not write to row {next_row}, column {col_letter}: {cell_error}")
-                next_row += 1
-                sl_no_counter += 1
-
-            target_workbook.save()
-            logging.info("Data entry completed successfully!")
-
-            try:
-                self.backup_dir.mkdir(exist_ok=True)
-                backup_path = self.backup_dir / self.main_file_path.name
-                shutil.copy2(self.main_file_path, backup_path)
-                logging.info(f"A backup of the main file was successfully created at '{backup_path}'.")
-            except Exception as backup_error:
-                logging.error(f"Error creating backup: {backup_error}")
-
-            return len(sorted_data)
-        except Exception as e:
-            logging.error(f"An unexpected error occurred during data entry: {e}", exc_info=True)
-            return 0
-        finally:
-            if excel_app:
-                for book in excel_app.books:
-                    book.close()
-                excel_app.quit()
-
-
-# =============================================================================
-#   TASK 2: Emailer
-# =============================================================================
-
-class Emailer:
-    """Handles email creation and drafting with advanced data analysis."""
-
-    def __init__(self, config: ConfigLoader):
-        self.config = config
-        self.cell_map = config.get('cell_map_organization')
-        self.email_settings = config.get('email_settings')
-        self.triggers = config.get('email_filter_rules.pass_report_triggers', {})
-        self.review_folder = Path(config.get('paths.manual_review'))
-        self.primary_recipient = self.email_settings.get('primary_recipient')
-        self.secondary_recipient = self.email_settings.get('secondary_recipient')
-
-    def _is_critical_shading(self, val: Any) -> bool:
-        """Helper to determine if a shade value is critical (<=4)."""
-        if val is None: return False
-        str_val = str(val).strip()
-        if not str_val: return False
-
-        try:
-            if "/" in str_val:
-                first_part = str_val.split('/')[0]
-                return safe_float(first_part) < 4
-            else:
-                return safe_float(str_val) <= 4
-        except (ValueError, IndexError):
-            return False
-
-    def _analyze_report_data(self, file_path: Path) -> Dict[str, Any]:
-        """Performs a deep analysis of a report file to find potential issues."""
-        analysis = {"send_reason": "N/A"}
-        wb = None
-        try:
-            wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-            summary = wb[self.cell_map['sheet_name']]
-
-            # --- Safely Get Raw Values ---
-            order_width = safe_float(summary[self.cell_map['order_width']].value)
-            actual_width = safe_float(summary[self.cell_map['actual_width']].value)
-            ticked_yards = safe_float(summary[self.cell_map['ticked_yards']].value)
-            short_excess = safe_float(summary[self.cell_map['total_short_excess']].value)
-            avg_point = safe_float(summary[self.cell_map['avg_point']].value)
-            check_roll = int(safe_float(summary[self.cell_map['check_roll']].value))
-
-            # --- Width Shortage Check ---
-            width_diff = order_width - actual_width
-            if actual_width > 0 and order_width > 0 and width_diff > self.triggers.get('width_shortage_tolerance_inch',
-                                                                                       0.5):
-                analysis[
-                    "send_reason"] = f"Width shortage > {self.triggers.get('width_shortage_tolerance_inch', 0.5)}\""
-                return analysis
-
-            # --- Length Shortage Check ---
-            if ticked_yards > 0 and short_excess < 0:
-                length_percent = (abs(short_excess) / ticked_yards) * 100
-                if length_percent >= self.triggers.get('length_shortage_percentage', 0.5):
-                    analysis[
-                        "send_reason"] = f"Length shortage >= {self.triggers.get('length_shortage_percentage', 0.5)}%"
-                    return analysis
-
-            # --- Direct Average Point Check ---
-            if avg_point >= self.triggers.get('avg_point_threshold', 10):
-                analysis[
-                    "send_reason"] = f"Avg point {avg_point} >= threshold {self.triggers.get('avg_point_threshold', 10)}"
-                return analysis
-
-            # --- Shading Percentage Check (Only on visible sheets) ---
-            if check_roll > 0:
-                critical_shade_rolls = 0
-                visible_pages = [s for s in wb.worksheets if s.title.startswith("Page ") and s.sheet_state == 'visible']
-                for sheet in visible_pages:
-                    last_col = sheet.max_column
-                    for i in range(2, last_col + 1, 4):
-                        is_roll_critical = False
-                        for j in range(i, i + 4):
-                            if j > last_col: break
-                            for k in range(15, 18):
-                                if self._is_critical_shading(sheet.cell(row=k, column=j).value):
-                                    is_roll_critical = True
-                                    break
-                            if is_roll_critical: break
-                        if is_roll_critical: critical_shade_rolls += 1
-
-                shading_percent = (critical_shade_rolls / check_roll) * 100
-                if shading_percent >= self.triggers.get('shading_percentage_threshold', 15):
-                    analysis[
-                        "send_reason"] = f"Critical shading >= {self.triggers.get('shading_percentage_threshold', 15)}%"
-                    return analysis
-
-            return analysis
-        except Exception as e:
-            logging.error(f"Could not analyze data for '{file_path.name}': {e}")
-            return {"send_reason": "Analysis Error"}
-        finally:
-            if wb:
-                wb.close()
-
-    def _get_report_data(self, file_path: Path) -> Optional[Dict]:
-        """Collects basic data for the email from the Excel file."""
-        wb = None
-        try:
-            wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-            sheet_name = self.config.get('cell_map_organization.sheet_name')
-            sheet = wb[sheet_name]
-            data = {}
-            for key, cell in self.config.get('cell_map_organization').items():
-                if key != 'sheet_name':
-                    data[key] = str(sheet[cell].value or '').strip()
-            data['file_path'] = file_path
-            return data
-        except Exception as e:
-            logging.error(f"Could not read data from '{file_path.name}': {e}")
-            return None
-        finally:
-            if wb:
-                wb.close()
-
-    def _classify_report(self, report: Dict) -> str:
-        """Classifies a report as 'SEND' or 'REVIEW' based on advanced analysis."""
-        result_lower = report.get('result', '').lower()
-
-        if 'fail' in result_lower or 'rejected' in result_lower:
-            return 'SEND'
-
-        if 'pass' in result_lower:
-            analysis_result = self._analyze_report_data(report['file_path'])
-            if analysis_result["send_reason"] != "N/A":
-                logging.info(
-                    f"   - '{report['file_path'].name}' is a PASS report, but will be sent. Reason: {analysis_result['send_reason']}.")
-                return 'SEND'
-
-        logging.info(f"   - '{report['file_path'].name}' is a standard PASS report. It will be skipped.")
-        return 'REVIEW'
-
-    def _generate_email_body(self, buyer: str, supplier: str, reports: List[Dict]) -> str:
-        """Generates the HTML body for the email, grouped by style."""
-        body = f"""
-        <html><head><style>
-            body {{ font-family: Calibri, sans-serif; font-size: 11pt; }}
-            .fail-text {{ color: red; font-weight: bold; }}
-            .pass-text {{ color: green; }}
-            .container {{ margin-bottom: 8px; }}
-            .icon {{ font-size: 1.1em; }}
-        </style></head><body>
-            <p>Dear Concern,</p>
-            <p>Please find the attached Fabric Inspection Report(s). The summary is mentioned below:</p>
-            <p style="margin: 0;"><b>Buyer:</b> {buyer}</p>
-            <p style="margin: 10px 0;"><b>Supplier:</b> {supplier}</p><hr>
-        """
-
-        reports_by_style = defaultdict(list)
-        for r in reports:
-            reports_by_style[r.get('style', 'N/A')].append(r)
-
-        for style, style_reports in reports_by_style.items():
-            body += f'<p style="margin-top: 15px; margin-bottom: 5px;"><b>Style:</b> {style}</p>'
-            body += '<div style="margin-top: 5px; padding-left: 25px;">'
-            for report in style_reports:
-                result = report.get('result', 'N/A')
-                comment = report.get('comment', '')
-                result_class = "fail-text" if any(w in result.lower() for w in ['fail', 'rejected']) else "pass-text"
-                reason_text = f"Due to: {comment}" if comment else ""
-
-                body += f"""
-                <div class="container">
-                    <span class="icon">➢</span> 
-                    <b>{report.get('color', 'N/A')}</b> ({report.get('rolls', 'N/A')} Rolls): 
-                    <span class="{result_class}">{result.upper()}</span> {reason_text}
-                </div>"""
-            body += "</div>"
-
-        body += "<br><p>Thanks.</p><p>Best Regards,<br>Chanchol Roy<br>QED Department</p></body></html>"
-        return body
-
-    def run(self, source_files_list: List[Path]) -> Tuple[int, int]:
-        """Executes the email automation, drafts emails, and copies review files."""
-        logging.info("=" * 50 + "\nTASK 2: Starting Email Automation...\n" + "=" * 50)
-        if not source_files_list:
-            logging.warning("No files found to email.")
-            return 0, 0
-
-        all_reports = [self._get_report_data(f) for f in source_files_list if f]
-        all_reports = [r for r in all_reports if r]
-
-        logging.info(f"Found a total of {len(all_reports)} reports. Starting advanced filtering...")
-
-        reports_to_send = []
-        reports_to_review = []
-        self.review_folder.mkdir(exist_ok=True)
-
-        for report in all_reports:
-            if self._classify_report(report) == 'SEND':
-                reports_to_send.append(report)
-            else:
-                reports_to_review.append(report)
-
-        reviewed_count = 0
-        for report in reports_to_review:
-            try:
-                shutil.copy2(report['file_path'], self.review_folder / report['file_path'].name)
-                reviewed_count += 1
-            except Exception as e:
-                logging.error(f"Failed to COPY '{report['file_path'].name}' to review folder: {e}")
-        if reviewed_count > 0:
-            logging.info(f"{reviewed_count} standard PASS report(s) were COPIED to Manual Review.")
-
-        if not reports_to_send:
-            logging.info("Filtering complete. No critical reports found to be sent via email.")
-            return 0, reviewed_count
-
-        logging.info(f"Filtering complete. {len(reports_to_send)} email drafts will be created.")
-        grouped_reports = defaultdict(list)
-        for report in reports_to_send:
-            grouped_reports[(report.get('buyer', 'N/A'), report.get('supplier', 'N/A'))].append(report)
-
-        drafts_created = 0
-        try:
-            outlook = win32.Dispatch('outlook.application')
-            for (buyer, supplier), reports in grouped_reports.items():
-                has_fail_report = any(
-                    'fail' in r.get('result', '').lower() or 'rejected' in r.get('result', '').lower() for r in reports)
-                recipient = self.primary_recipient if has_fail_report else self.secondary_recipient
-                consignments = sorted(list({r.get('consignment', '') for r in reports if r.get('consignment', '')}))
-                subject = f"{buyer} # {', '.join(consignments)} Rolls consignment Fabric Inspection Status"
-                body = self._generate_email_body(buyer, supplier, reports)
-                attachments = [str(r['file_path']) for r in reports]
-
-                mail = outlook.CreateItem(0)
-                mail.To = recipient
-                mail.Subject = subject
-                mail.HTMLBody = body
-                for attachment in attachments: mail.Attachments.Add(attachment)
-                mail.Save()
-                drafts_created += 1
-                logging.info(f"Successfully saved email draft for '{recipient}' with {len(attachments)} attachment(s).")
-        except Exception as e:
-            logging.error(f"Failed to save email draft using Outlook: {e}")
-            logging.error("Please ensure the Outlook application is running.")
-
-        return drafts_created, reviewed_count
-
-
-# =============================================================================
-#   TASK 3: File Organizer
-# =============================================================================
-
-class FileOrganizer:
-    """Handles file organization and cleanup of empty directories."""
-
-    def __init__(self, config: ConfigLoader):
-        self.config = config
-        self.source_dir = Path(config.get('paths.pending_reports'))
-        self.output_dir = Path(config.get('paths.ongoing_work'))
-        self.error_dir = self.source_dir.parent / "Error Reports"
-        self.cell_map = config.get('cell_map_organization')
-
-    def _clean_name(self, name: Any) -> str:
-        """Cleans a string to be used as a valid file/folder name."""
-        name_str = str(name or '').strip()
-        return re.sub(r'[\\/*?:"<>|]', '', name_str)
-
-    def _format_date(self, date_value: Any) -> str:
-        """Formats a date value into a specific string format."""
-        if isinstance(date_value, datetime):
-            return date_value.strftime("(%d-%m-%y)")
-        try:
-            return pd.to_datetime(date_value).strftime("(%d-%m-%y)")
-        except (ValueError, TypeError):
-            return f"({self._clean_name(date_value)})"
-
-    def _cleanup_empty_dirs(self, path: Path):
-        """Recursively deletes empty subdirectories."""
-        for dirpath, _, _ in os.walk(path, topdown=False):
-            if Path(dirpath) == path: continue
-            try:
-                os.rmdir(dirpath)
-                logging.info(f"   -> Cleaned up empty folder: {dirpath}")
-            except OSError:
-                pass  # Directory is not empty
-
-    def run(self, source_files_list: List[Path]) -> int:
-        """Executes the file organization process."""
-        logging.info("=" * 50 + "\nTASK 3: Starting File Organization...\n" + "=" * 50)
-        self.error_dir.mkdir(exist_ok=True)
-        self.output_dir.mkdir(exist_ok=True)
-
-        if not source_files_list:
-            logging.warning("No files to organize.")
-            return 0
-
-        organized_count = 0
-        for file_path in source_files_list:
-            if not file_path.exists():
-                continue
-
-            wb = None
-            try:
-                logging.info(f"\n[*] Organizing file: {file_path.name}")
-                wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-                sheet = wb[self.cell_map['sheet_name']]
-
-                data = {key: self._clean_name(sheet[cell].value) for key, cell in self.cell_map.items() if
-                        key != 'sheet_name'}
-                data['date'] = self._format_date(sheet[self.cell_map['date']].value)
-
-                try:
-                    consignment_val = sheet[self.cell_map['consignment']].value
-                    data['consignment'] = self._clean_name(int(safe_float(consignment_val)))
-                except (ValueError, TypeError):
-                    data['consignment'] = self._clean_name(consignment_val)
-
-                try:
-                    rolls_val = sheet[self.cell_map['rolls']].value
-                    data['rolls'] = self._clean_name(int(safe_float(rolls_val)))
-                except (ValueError, TypeError):
-                    data['rolls'] = self._clean_name(rolls_val)
-
-                wb.close()
-                wb = None
-
-                if not all([data['buyer'], data['supplier'], data['consignment']]):
-                    raise ValueError("Missing required info: Buyer, Supplier, or Consignment.")
-
-                folder_name = f"CON-{data['consignment']} {data['date']}"
-                destination_folder = self.output_dir / data['buyer'] / folder_name
-                destination_folder.mkdir(parents=True, exist_ok=True)
-
-                new_filename = f"{data['style']}, COLOR-{data['color']}, Roll-{data['rolls']}, {data['fabric_code']}{file_path.suffix}"
-                final_path = destination_folder / new_filename
-
-                shutil.move(str(file_path), str(final_path))
-                logging.info(f"   [✓] Successfully MOVED to '{final_path.relative_to(self.output_dir.parent)}'.")
-                organized_count += 1
-            except Exception as e:
-                logging.error(f"   [X] Error organizing '{file_path.name}': {e}")
-                if wb: wb.close()
-                try:
-                    shutil.move(str(file_path), str(self.error_dir / file_path.name))
-                except Exception as move_error:
-                    logging.error(f"Could not even move to Error folder: {move_error}")
-
-        logging.info("\nCleaning up empty source folders...")
-        self._cleanup_empty_dirs(self.source_dir)
-        logging.info("File organization completed.")
-        return organized_count
-
-
-# ==========================================================
-#                         Main Driver
-# ==========================================================
-
-class AutomationSystem:
-    """Manages the entire automation workflow."""
-
-    def __init__(self):
-        setup_logging()
-        self.config = ConfigLoader(file_path="master.json")
-        self.data_entry_handler = DataEntryHandler(self.config)
-        self.emailer = Emailer(self.config)
-        self.file_organizer = FileOrganizer(self.config)
-
-        self.pending_path = Path(self.config.get('paths.pending_reports'))
-        self.ongoing_path = Path(self.config.get('paths.ongoing_work'))
-
-    def _display_menu(self):
-        """Displays the main menu to the user."""
-        print("\n" + "=" * 60)
-        print("    DEBONAIR GROUP - Quality Automation System (v17.4)")
-        print("    Created by Chanchol Roy")
-        print("=" * 60)
-        print("Which task would you like to perform? Please enter a number:")
-        print("  1. Run Full Process (Data Entry -> Email -> Organize)")
-        print("  2. Only Data Entry")
-        print("  3. Only Create Email Drafts")
-        print("  4. Only Organize Files")
-        print("  0. Exit Program")
-        print("=" * 60)
-
-    def _get_files_for_task(self, task_name: str) -> Optional[List[Path]]:
-        """Asks the user to choose a folder and returns the files from it."""
-        print(f"\nFor the '{task_name}' task, which folder do you want to use?")
-        print("  1. Pending Reports")
-        print("  2. Ongoing Work")
-        folder_choice = input("Your choice (1 or 2): ").strip()
-
-        if folder_choice == '1':
-            target_path = self.pending_path
-        elif folder_choice == '2':
-            target_path = self.ongoing_path
-        else:
-            print("❌ Invalid choice. Please enter 1 or 2.")
-            return None
-
-        files = get_excel_files(target_path)
-        if not files:
-            logging.error(f"No Excel files found in the '{target_path.name}' folder.")
-            return None
-        return files
-
-    def run(self):
-        """Runs the main loop of the automation system."""
-        while True:
-            self._display_menu()
-            choice = input("Your choice: ").strip()
-
-            if choice == '1':
-                files_in_pending = get_excel_files(self.pending_path)
-                if not files_in_pending:
-                    logging.error(
-                        f"Cannot run the full process because the '{self.pending_path.name}' folder is empty.")
-                else:
-                    initial_files = list(files_in_pending)
-
-                    rows_entered = self.data_entry_handler.run(initial_files)
-                    drafts_created, reviewed_count = self.emailer.run(initial_files)
-                    organized_count = self.file_organizer.run(initial_files)
-
-                    print("\n" + "-" * 25 + " ACTION SUMMARY " + "-" * 25)
-                    print(f"  - Initial Files Found: {len(initial_files)}")
-                    print(f"  - Rows Entered: {rows_entered}")
-                    print(f"  - Email Drafts Created: {drafts_created}")
-                    print(f"  - Files Copied to Review: {reviewed_count}")
-                    print(f"  - Files Organized: {organized_count}")
-                    print("-" * 68)
-
-            elif choice == '2':
-                files = self._get_files_for_task("Data Entry")
-                if files:
-                    rows_entered = self.data_entry_handler.run(files)
-                    print(f"\nSUMMARY: {rows_entered} row(s) were entered into the main workbook.")
-
-            elif choice == '3':
-                files = self._get_files_for_task("Email Drafts")
-                if files:
-                    drafts_created, reviewed_count = self.emailer.run(files)
-                    print(f"\nSUMMARY: {drafts_created} email draft(s) were created.")
-                    print(f"         {reviewed_count} file(s) were copied to the Manual Review folder.")
-
-            elif choice == '4':
-                files = self._get_files_for_task("File Organization")
-                if files:
-                    organized_count = self.file_organizer.run(files)
-                    print(f"\nSUMMARY: {organized_count} file(s) were organized.")
-
-            elif choice == '0':
-                print("Exiting program. Goodbye!")
-                break
-            else:
-                print("❌ Invalid input. Please enter a number between 0 and 4.")
-
-            input("\nPress Enter to return to the main menu...")
-
-
-if __name__ == "__main__":
-    try:
-        system = AutomationSystem()
-        system.run()
-    except Exception as e:
-        logging.critical(f"A critical error occurred while running the program: {e}", exc_info=True)
-        input("\nPress Enter to exit the program...")
-
+# -*- coding: utf-8 -*-
+# =================================================================================================
+#   Quality Automation Script (Version 17.4 - Simplified Avg Point Trigger)
+#   Description: This version simplifies the email filter logic. Instead of checking proximity
+#   to the standard point, it now triggers an email for a PASS report if the average
+#   point is above a simple, direct threshold (e.g., >=10), which is configurable
+#   in master.json for full user control.
+# =================================================================================================
+
+import atexit
+import os
+import sys
+import json
+import logging
+import queue
+import re
+import shutil
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from functools import cached_property, lru_cache, partial
+from operator import itemgetter
+from pathlib import Path
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Iterable, List, Dict, Any, Optional, Tuple
+
+# Windows-only stdlib module; used for single-keypress menu selection.
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# --- Required Library Imports & Error Handling ---
+try:
+    import numpy as np
+    import pandas as pd
+    import openpyxl
+    import xlwings as xw
+    from openpyxl.utils import column_index_from_string, coordinate_to_tuple, get_column_letter, range_boundaries
+    from openpyxl.utils.datetime import from_excel, MAC_EPOCH, WINDOWS_EPOCH
+    from openpyxl.styles.numbers import is_date_format
+    import pythoncom
+    import win32com.client as win32
+    from dotenv import load_dotenv
+except ImportError as e:
+    print(f"\nFATAL: A required library is not found: '{e.name}'.")
+    print("Please run this command in your terminal to install necessary libraries:")
+    print("pip install pandas openpyxl xlwings pywin32 python-dotenv")
+    sys.exit(1)
+
+# Optional: python-calamine is a Rust-backed Excel reader that parses value-only
+# sheets several times faster than openpyxl. The script works without it.
+try:
+    from python_calamine import CalamineWorkbook
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+# Optional: orjson decodes the configuration file a few times faster than the
+# stdlib json module. One startup parse either way.
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Optional: tqdm provides the progress bar during the full process. Without it
+# the run is silent between stages but otherwise identical.
+try:
+    from tqdm import tqdm
+    HAS_TQDM = True
+except ImportError:
+    HAS_TQDM = False
+
+
+# ==========================================================
+#                      Configuration & Setup
+# ==========================================================
+
+# Module logger; %-style arguments keep message formatting lazy, so disabled
+# levels cost a single enabled-check instead of building the string.
+log = logging.getLogger(__name__)
+
+
+def setup_logging(mode: str = 'w'):
+    """Sets up the logging system for both file and console output."""
+    log_file = "automation_log.txt"
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file, mode=mode, encoding='utf-8'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    if mode == 'w':
+        log.info("Logging system initialized. Log file: %s", log_file)
+
+
+def _init_worker_logging():
+    """Configures logging inside process-pool workers.
+
+    Spawned children re-import the module with an unconfigured root logger,
+    so without this the per-file messages from the extraction workers would
+    never reach automation_log.txt. Appending keeps the parent's log intact.
+    """
+    setup_logging(mode='a')
+
+
+class ConfigLoader:
+    """A class to load and access settings from a JSON file."""
+
+    def __init__(self, file_path: str):
+        self.config = self._load_config(file_path)
+        self._flat = self._flatten(self.config)
+
+    def _load_config(self, file_path: str) -> Dict[str, Any]:
+        """Loads configuration from a JSON file."""
+        try:
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            return orjson.loads(raw) if HAS_ORJSON else json.loads(raw)
+        except FileNotFoundError:
+            log.critical("❌ FATAL: Configuration file '%s' not found.", file_path)
+            sys.exit(1)
+        except ValueError:
+            log.critical("❌ FATAL: JSON syntax error in '%s'.", file_path)
+            sys.exit(1)
+
+    @staticmethod
+    def _flatten(tree: Dict[str, Any]) -> Dict[str, Any]:
+        """Walks the configuration once, mapping every dotted path to its
+        value. Intermediate sections are included so whole-section lookups
+        like 'email_settings' keep working."""
+        flat: Dict[str, Any] = {}
+        stack = [('', tree)]
+        while stack:
+            prefix, node = stack.pop()
+            for k, v in node.items():
+                dotted = prefix + k
+                flat[dotted] = v
+                if isinstance(v, dict):
+                    stack.append((dotted + '.', v))
+        return flat
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Accesses nested configuration values using dot notation.
+
+        The configuration never changes at runtime, so dotted paths are
+        flattened once at load time and every get() is a single dict lookup
+        instead of a split plus nested descent.
+        """
+        return self._flat.get(key, default)
+
+
+# =============================================================================
+#   Helper Functions
+# =============================================================================
+
+# Compiled once at import; these run inside per-file and per-cell loops.
+_INVALID_NAME_CHARS = re.compile(r'[\\/*?:"<>|]')
+_DIGITS = re.compile(r'\d+')
+
+# Defect points live in columns V..AO of every Page sheet.
+_DEFECT_FIRST_COL = column_index_from_string('V')
+_DEFECT_LAST_COL = column_index_from_string('AO')
+
+
+def get_excel_files(folder_path: Path) -> List[str]:
+    """Finds all .xlsx and .xlsm files in a specified folder.
+
+    Returns plain path strings sorted by file name; callers that need path
+    semantics wrap them in Path at the boundary (see get_excel_files_cached).
+    """
+    # One scandir traversal instead of two full rglob passes; DirEntry knows
+    # whether it is a directory without an extra stat call, and a missing
+    # root folder surfaces from the scan itself rather than a prior is_dir().
+    # Keeping entries as strings here avoids a PurePath allocation per file.
+    root = str(folder_path)
+    excel_files = []
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith(('.xlsx', '.xlsm')):
+                        excel_files.append(entry.path)
+        except OSError as e:
+            if current == root:
+                log.warning("Warning: The folder '%s' does not exist.", folder_path)
+            else:
+                log.warning("Could not scan folder '%s': %s", current, e)
+    excel_files.sort(key=os.path.basename)
+    return excel_files
+
+
+@lru_cache(maxsize=8)
+def _scan_cached(path_str: str, mtime_ns: int) -> Tuple[str, ...]:
+    """Folder scan memoized on (path, mtime); see get_excel_files_cached."""
+    return tuple(get_excel_files(Path(path_str)))
+
+
+def get_excel_files_cached(folder_path: Path) -> List[Path]:
+    """Returns the Excel file scan from cache while the folder is unchanged.
+
+    The cache key includes the folder's mtime, so adding or removing a direct
+    entry invalidates it automatically. Deeper mutations do not bump the root
+    mtime, which is why the organizer clears the cache after moving files.
+    """
+    try:
+        mtime_ns = folder_path.stat().st_mtime_ns
+    except OSError:
+        return [Path(p) for p in get_excel_files(folder_path)]
+    return [Path(p) for p in _scan_cached(str(folder_path), mtime_ns)]
+
+
+# Small pool for speculative folder scans kicked off while the program is
+# blocked on user input; see AutomationSystem._prompt.
+_scan_pool = ThreadPoolExecutor(max_workers=2)
+
+
+def safe_float(value: Any) -> float:
+    """Safely converts a value to a float, returning 0.0 if conversion fails."""
+    if value is None:
+        return 0.0
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _fast_copy(src: Path, dst: Path) -> None:
+    """Copies a file with metadata using the fastest available kernel path.
+
+    On Linux, os.copy_file_range keeps the bytes in the kernel (and is a
+    metadata-only reflink on filesystems that support it). Elsewhere, or when
+    the kernel path is unavailable, this falls back to shutil.copy2, which
+    already uses the native fast copy on Windows.
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            shutil.copystat(src, dst)
+            return
+        except OSError:
+            pass  # Cross-device or unsupported filesystem; use the portable copy.
+    shutil.copy2(src, dst)
+
+
+def _fast_move(src: Path, dst: Path) -> None:
+    """Moves a file, preferring a single rename syscall over copy-and-delete."""
+    try:
+        os.replace(src, dst)
+    except OSError:
+        # Different volume: fall back to shutil.move's copy-then-delete.
+        shutil.move(str(src), str(dst))
+
+
+def _load_sheet_values(file_path: Path, sheet_name: str) -> List[List[Any]]:
+    """Loads one sheet as a 2-D list of plain values.
+
+    Prefers python-calamine when installed, since only cell values are needed
+    on the read paths; falls back to an openpyxl read-only pass otherwise.
+    """
+    if HAS_CALAMINE:
+        calamine_wb = CalamineWorkbook.from_path(str(file_path))
+        # skip_empty_area would trim leading empty rows/columns, shifting the
+        # grid away from the absolute A1 coordinates _sheet_value indexes by.
+        return calamine_wb.get_sheet_by_name(sheet_name).to_python(skip_empty_area=False)
+    wb = None
+    try:
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+        return [list(row) for row in wb[sheet_name].iter_rows(values_only=True)]
+    finally:
+        if wb:
+            wb.close()
+
+
+def _sheet_value(rows: List[List[Any]], address: str) -> Any:
+    """Reads a single cell value from a 2-D value list using an A1 address."""
+    row, col = coordinate_to_tuple(address)
+    try:
+        return rows[row - 1][col - 1]
+    except IndexError:
+        return None
+
+
+# XML namespaces used inside XLSX parts.
+_SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_ID_ATTR = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+
+def _stream_cell_value(cell_el, shared_strings: List[str], date_styles: set, epoch) -> Any:
+    """Converts one streamed <c> element to the value openpyxl would return."""
+    cell_type = cell_el.get('t', 'n')
+    if cell_type == 'inlineStr':
+        inline = cell_el.find(f'{_SHEET_NS}is')
+        if inline is None:
+            return None
+        return ''.join(t.text or '' for t in inline.iter(f'{_SHEET_NS}t'))
+    value_el = cell_el.find(f'{_SHEET_NS}v')
+    if value_el is None or value_el.text is None:
+        return None
+    text = value_el.text
+    if cell_type == 's':
+        return shared_strings[int(text)]
+    if cell_type == 'b':
+        return bool(int(text))
+    if cell_type in ('str', 'e'):
+        return text
+    number = int(text) if '.' not in text and 'e' not in text.lower() else float(text)
+    if int(cell_el.get('s', '0')) in date_styles:
+        return from_excel(number, epoch=epoch)
+    return number
+
+
+def _stream_read_cells(file_path: Path, sheet_name: str, addresses: Tuple[str, ...]) -> Dict[str, Any]:
+    """Reads a small set of cells straight from the XLSX zip with a streaming parse.
+
+    openpyxl parses the whole workbook even when only a handful of Summary
+    cells are needed. This opens just the target sheet part, preloads the
+    shared strings and date styles, and stops walking the sheet XML as soon
+    as every wanted address has been seen.
+    """
+    wanted = set(addresses)
+    values: Dict[str, Any] = {}
+    with zipfile.ZipFile(file_path) as zf:
+        # Resolve the sheet name to its part via workbook.xml and its rels.
+        wb_root = ET.fromstring(zf.read('xl/workbook.xml'))
+        workbook_pr = wb_root.find(f'{_SHEET_NS}workbookPr')
+        date1904 = workbook_pr is not None and workbook_pr.get('date1904') in ('1', 'true')
+        rel_id = None
+        for sheet_el in wb_root.iter(f'{_SHEET_NS}sheet'):
+            if sheet_el.get('name') == sheet_name:
+                rel_id = sheet_el.get(_REL_ID_ATTR)
+                break
+        if rel_id is None:
+            raise KeyError(f"Worksheet '{sheet_name}' does not exist.")
+        rels_root = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+        target = next(rel.get('Target') for rel in rels_root if rel.get('Id') == rel_id)
+        sheet_part = target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+
+        part_names = set(zf.namelist())
+        shared_strings: List[str] = []
+        if 'xl/sharedStrings.xml' in part_names:
+            with zf.open('xl/sharedStrings.xml') as f:
+                for _, el in ET.iterparse(f):
+                    if el.tag == f'{_SHEET_NS}si':
+                        shared_strings.append(''.join(t.text or '' for t in el.iter(f'{_SHEET_NS}t')))
+                        el.clear()
+
+        # Styles are needed to tell date serials apart from plain numbers.
+        date_styles = set()
+        if 'xl/styles.xml' in part_names:
+            styles_root = ET.fromstring(zf.read('xl/styles.xml'))
+            custom_formats = {int(f.get('numFmtId')): f.get('formatCode', '')
+                              for f in styles_root.iter(f'{_SHEET_NS}numFmt')}
+            cell_xfs = styles_root.find(f'{_SHEET_NS}cellXfs')
+            if cell_xfs is not None:
+                for style_idx, xf in enumerate(cell_xfs):
+                    fmt_id = int(xf.get('numFmtId', '0'))
+                    if 14 <= fmt_id <= 22 or 45 <= fmt_id <= 47 or is_date_format(custom_formats.get(fmt_id, '')):
+                        date_styles.add(style_idx)
+
+        epoch = MAC_EPOCH if date1904 else WINDOWS_EPOCH
+        with zf.open(sheet_part) as f:
+            for _, el in ET.iterparse(f):
+                if el.tag == f'{_SHEET_NS}c' and el.get('r') in wanted:
+                    values[el.get('r')] = _stream_cell_value(el, shared_strings, date_styles, epoch)
+                    wanted.discard(el.get('r'))
+                    if not wanted:
+                        break
+                elif el.tag == f'{_SHEET_NS}row':
+                    el.clear()
+    for addr in addresses:
+        values.setdefault(addr, None)
+    return values
+
+
+def _read_summary_cells(file_path: Path, cell_map: Dict[str, str]) -> Dict[str, Any]:
+    """Reads the mapped Summary fields of one file without a full workbook parse."""
+    addresses = tuple(addr for key, addr in cell_map.items() if key != 'sheet_name')
+    if HAS_CALAMINE:
+        rows = _load_sheet_values(file_path, cell_map['sheet_name'])
+        cells = {addr: _sheet_value(rows, addr) for addr in addresses}
+    else:
+        cells = _stream_read_cells(file_path, cell_map['sheet_name'], addresses)
+    return {key: cells[addr] for key, addr in cell_map.items() if key != 'sheet_name'}
+
+
+# Shared hidden Excel instance. Cold-starting Excel costs seconds, so one
+# instance is reused across data entry runs and shut down at interpreter exit.
+_excel_app = None
+
+
+def _close_shared_excel_app():
+    """Closes the shared Excel instance and its workbooks."""
+    global _excel_app
+    if _excel_app is None:
+        return
+    try:
+        for book in _excel_app.books:
+            book.close()
+        _excel_app.quit()
+    except Exception:
+        pass
+    _excel_app = None
+
+
+def _shared_excel_app():
+    """Returns a hidden Excel instance, shared only across main-thread runs.
+
+    The app is COM state bound to the apartment that created it. Worker
+    threads (the full-process flow) tear their apartment down after the run,
+    which would leave the global pointing at a dead apartment, so they get a
+    private instance instead; callers off the main thread must quit() it.
+    """
+    global _excel_app
+    if threading.current_thread() is not threading.main_thread():
+        return xw.App(visible=False)
+    if _excel_app is not None:
+        try:
+            _excel_app.books  # Probe: the instance may have been closed externally.
+            return _excel_app
+        except Exception:
+            _excel_app = None
+    _excel_app = xw.App(visible=False)
+    atexit.register(_close_shared_excel_app)
+    return _excel_app
+
+
+# =============================================================================
+#   Parallel Extraction Workers
+# =============================================================================
+# The per-file read phase of each task is embarrassingly parallel: every file
+# is an independent, parse-heavy read. These functions live at module level so
+# they can be pickled into a ProcessPoolExecutor; each worker opens its
+# workbook exactly once and extracts everything its task needs in one pass.
+
+@lru_cache(maxsize=None)
+def _address_layout(addresses: Tuple[str, ...]) -> Tuple[Dict[str, Tuple[int, int]], Tuple[int, int, int, int]]:
+    """Parses a fixed set of A1 addresses once and returns coordinates plus bounding box.
+
+    The cell maps never change at runtime, so the parse results are cached for
+    the life of the process instead of re-splitting every address per file.
+    """
+    coords = {addr: coordinate_to_tuple(addr) for addr in addresses}
+    row_indices = [r for r, _ in coords.values()]
+    col_indices = [c for _, c in coords.values()]
+    return coords, (min(row_indices), min(col_indices), max(row_indices), max(col_indices))
+
+
+def _read_cells(sheet, addresses: Tuple[str, ...]) -> Dict[str, Any]:
+    """Reads a set of A1 addresses from a sheet with one bounded iter_rows pass."""
+    coords, (min_r, min_c, max_r, max_c) = _address_layout(addresses)
+    grid = list(sheet.iter_rows(min_row=min_r, max_row=max_r, min_col=min_c, max_col=max_c, values_only=True))
+    values = {}
+    for addr, (r, c) in coords.items():
+        row = grid[r - min_r] if r - min_r < len(grid) else ()
+        values[addr] = row[c - min_c] if c - min_c < len(row) else None
+    return values
+
+
+def _read_summary_fields(wb, cell_map: Dict[str, str], file_name: str) -> Optional[Dict[str, Any]]:
+    """Reads every mapped Summary cell of a workbook, keyed by field name."""
+    try:
+        sheet = wb[cell_map['sheet_name']]
+        addresses = tuple(addr for key, addr in cell_map.items() if key != 'sheet_name')
+        cells = _read_cells(sheet, addresses)
+        return {key: cells[addr] for key, addr in cell_map.items() if key != 'sheet_name'}
+    except Exception as e:
+        log.error("Could not read Summary data from '%s': %s", file_name, e)
+        return None
+
+
+def _visible_page_sheets(wb) -> List[Any]:
+    """Returns the visible 'Page ' worksheets of an open workbook.
+
+    The title check runs first so non-Page sheets are rejected on the name
+    alone (parsed once from workbook.xml) and their state is never touched.
+    """
+    return [s for s in wb._sheets if s.title.startswith("Page ") and s.sheet_state == 'visible']
+
+
+def _read_sorting_keys(fields: Dict[str, Any], file_name: str) -> Tuple[str, int, str, int]:
+    """Builds sorting keys from pre-read Summary fields according to the rule: Buyer > Consignment > Result > Rolls."""
+    try:
+        buyer = str(fields.get('buyer') or '').strip()
+        consignment_val = str(fields.get('consignment') or '').strip()
+        numeric_match = _DIGITS.search(consignment_val)
+        consignment_num = int(numeric_match.group()) if numeric_match else 0
+        result = str(fields.get('result') or '').strip()
+        rolls = int(safe_float(fields.get('rolls')))
+        return (buyer, consignment_num, result, rolls)
+    except Exception as e:
+        log.error("Error reading sorting key from '%s': %s", file_name, e)
+        return ('', 0, '', 0)
+
+
+def _extract_entry_data(wb, file_name: str, summary_mapping: Dict[str, str],
+                        normalized_defect_mapping: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """Extracts data from an already-open source workbook for entry."""
+    try:
+        entry_data = {}
+        summary_cells = _read_cells(wb["Summary"], tuple(summary_mapping))
+        for source_cell, target_column in summary_mapping.items():
+            entry_data[target_column] = summary_cells[source_cell]
+
+        defect_points = {col: 0 for col in normalized_defect_mapping.values()}
+        unmatched_defect_points = 0
+
+        for sheet in _visible_page_sheets(wb):
+            # A single iter_rows pass is far cheaper than per-cell lookups in read-only mode.
+            rows = list(sheet.iter_rows(min_row=23, max_row=38, min_col=1, max_col=_DEFECT_LAST_COL,
+                                        values_only=True))
+            if not rows:
+                continue
+            # Sum all 16 defect rows in one vectorized reduction; coercion
+            # failures become NaN and count as zero, like safe_float did.
+            block = np.array([row[_DEFECT_FIRST_COL - 1:_DEFECT_LAST_COL] for row in rows], dtype=object)
+            numeric = pd.to_numeric(block.ravel(), errors='coerce').reshape(block.shape)
+            row_sums = np.nansum(numeric, axis=1)
+
+            for row, current_row_sum in zip(rows, row_sums):
+                defect_name = str(row[0] or '').strip()
+                if not defect_name: continue
+                # Interning collapses the repeated defect names from every
+                # sheet onto shared strings, making the dict lookups pointer
+                # comparisons instead of character scans.
+                target_col = normalized_defect_mapping.get(sys.intern(defect_name.lower()))
+                if target_col:
+                    defect_points[target_col] = defect_points.get(target_col, 0) + float(current_row_sum)
+                else:
+                    unmatched_defect_points += float(current_row_sum)
+
+        entry_data.update(defect_points)
+        entry_data['AK'] = unmatched_defect_points
+        return entry_data
+    except Exception as e:
+        log.error("  - Error processing file %s: %s", file_name, e)
+        return None
+
+
+def _data_entry_worker(file_path: Path, summary_mapping: Dict[str, str], normalized_defect_mapping: Dict[str, str],
+                       cell_map: Dict[str, str]) -> Optional[Tuple[Tuple, Dict[str, Any], str]]:
+    """Extracts (sort_keys, entry_data, file_name) for one file. Runs in a worker process.
+
+    The flat tuple keeps the sort key in slot 0 so the caller can sort with
+    itemgetter(0) on the C fast path instead of a per-comparison dict lookup.
+    """
+    log.info("   -> Reading data from: %s", file_path.name)
+    wb = None
+    try:
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    except Exception as e:
+        log.error("  - Could not open file %s: %s", file_path.name, e)
+        return None
+    try:
+        data = _extract_entry_data(wb, file_path.name, summary_mapping, normalized_defect_mapping)
+        if not data:
+            return None
+        fields = _read_summary_fields(wb, cell_map, file_path.name)
+        sort_keys = _read_sorting_keys(fields, file_path.name) if fields else ('', 0, '', 0)
+        return (sort_keys, data, file_path.name)
+    finally:
+        wb.close()
+
+
+def _count_critical_shade_rolls(shade_rows: List[Tuple]) -> int:
+    """Counts the rolls on one Page sheet that carry a critical shade value.
+
+    Rolls occupy 4-column blocks starting at column B of the shade rows. A
+    value is critical when it is non-empty and either its part before a '/'
+    is < 4 or, without a '/', the whole value is <= 4 (non-numeric values
+    coerce to 0 and therefore count, matching the old scalar check). The
+    whole block is evaluated as one set of vector operations instead of a
+    branchy per-cell loop.
+    """
+    if not shade_rows:
+        return 0
+    width = max(len(r) for r in shade_rows)
+    if width < 2:
+        return 0
+    arr = np.array([tuple(r) + (None,) * (width - len(r)) for r in shade_rows], dtype=object)[:, 1:]
+    # Pad to a multiple of 4 so the per-roll reduction can reshape cleanly.
+    pad = (-arr.shape[1]) % 4
+    if pad:
+        arr = np.concatenate([arr, np.full((arr.shape[0], pad), None, dtype=object)], axis=1)
+
+    str_arr = np.char.strip(np.where(np.equal(arr, None), '', arr).astype('U32'))
+    non_empty = str_arr != ''
+    has_slash = np.char.find(str_arr, '/') >= 0
+    first_part = np.char.partition(str_arr, '/')[..., 0]
+    parsed = pd.to_numeric(first_part.ravel(), errors='coerce').reshape(first_part.shape)
+    values = np.where(np.isnan(parsed), 0.0, parsed)
+
+    critical = non_empty & np.where(has_slash, values < 4, values <= 4)
+    return int(critical.any(axis=0).reshape(-1, 4).any(axis=1).sum())
+
+
+def _analyze_report_data(wb, file_name: str, fields: Dict[str, Any],
+                         triggers: Dict[str, Any]) -> Dict[str, Any]:
+    """Performs a deep analysis of a report to find potential issues.
+
+    Summary values arrive pre-read in fields; the workbook is only consulted
+    when the shading check has to walk the Page sheets.
+    """
+    analysis = {"send_reason": "N/A"}
+    try:
+        # --- Safely Get Raw Values ---
+        order_width = safe_float(fields.get('order_width'))
+        actual_width = safe_float(fields.get('actual_width'))
+        ticked_yards = safe_float(fields.get('ticked_yards'))
+        short_excess = safe_float(fields.get('total_short_excess'))
+        avg_point = safe_float(fields.get('avg_point'))
+        check_roll = int(safe_float(fields.get('check_roll')))
+
+        # --- Width Shortage Check ---
+        width_diff = order_width - actual_width
+        if actual_width > 0 and order_width > 0 and width_diff > triggers.get('width_shortage_tolerance_inch', 0.5):
+            analysis["send_reason"] = f"Width shortage > {triggers.get('width_shortage_tolerance_inch', 0.5)}\""
+            return analysis
+
+        # --- Length Shortage Check ---
+        if ticked_yards > 0 and short_excess < 0:
+            length_percent = (abs(short_excess) / ticked_yards) * 100
+            if length_percent >= triggers.get('length_shortage_percentage', 0.5):
+                analysis["send_reason"] = f"Length shortage >= {triggers.get('length_shortage_percentage', 0.5)}%"
+                return analysis
+
+        # --- Direct Average Point Check ---
+        avg_point_threshold = triggers.get('avg_point_threshold', 10)
+        if avg_point >= avg_point_threshold:
+            analysis["send_reason"] = f"Avg point {avg_point} >= threshold {avg_point_threshold}"
+            return analysis
+
+        # --- Shading Percentage Check (Only on visible sheets) ---
+        # The shading scan walks every visible Page sheet, which dominates the
+        # analysis cost, and it is only a tiebreaker. Run it only when the
+        # average point is close enough to its threshold for shading to
+        # plausibly tip the report.
+        shading_threshold = triggers.get('shading_percentage_threshold', 15)
+        if check_roll > 0 and avg_point >= 0.7 * avg_point_threshold:
+            critical_shade_rolls = 0
+            for sheet in _visible_page_sheets(wb):
+                # Read the three shade rows once and evaluate them vectorized.
+                shade_rows = list(sheet.iter_rows(min_row=15, max_row=17, values_only=True))
+                critical_shade_rolls += _count_critical_shade_rolls(shade_rows)
+
+                # The percentage can only grow; stop scanning once it is reached.
+                if (critical_shade_rolls / check_roll) * 100 >= shading_threshold:
+                    break
+
+            shading_percent = (critical_shade_rolls / check_roll) * 100
+            if shading_percent >= shading_threshold:
+                analysis["send_reason"] = f"Critical shading >= {shading_threshold}%"
+                return analysis
+
+        return analysis
+    except Exception as e:
+        log.error("Could not analyze data for '%s': %s", file_name, e)
+        return {"send_reason": "Analysis Error"}
+
+
+def _read_report_data(fields: Dict[str, Any], file_path: Path) -> Dict:
+    """Builds the email report dict from pre-read Summary fields."""
+    data = {key: str(value or '').strip() for key, value in fields.items()}
+    data['file_path'] = file_path
+    # Raw values for the file organizer, which needs the original types
+    # (datetime dates, numeric consignment/rolls) rather than the
+    # stringified versions used in the email body.
+    data['raw_date'] = fields.get('date')
+    data['raw_consignment'] = fields.get('consignment')
+    data['raw_rolls'] = fields.get('rolls')
+    return data
+
+
+def _email_report_worker(file_path: Path, cell_map: Dict[str, str],
+                         triggers: Dict[str, Any]) -> Optional[Dict]:
+    """Reads and classifies one report file as 'SEND' or 'REVIEW'. Runs in a worker process."""
+    wb = None
+    try:
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    except Exception as e:
+        log.error("Could not open '%s': %s", file_path.name, e)
+        return None
+    try:
+        fields = _read_summary_fields(wb, cell_map, file_path.name)
+        if fields is None:
+            return None
+        report = _read_report_data(fields, file_path)
+
+        result_lower = report.get('result', '').lower()
+        if 'fail' in result_lower or 'rejected' in result_lower:
+            report['classification'] = 'SEND'
+            return report
+
+        if 'pass' in result_lower:
+            analysis_result = _analyze_report_data(wb, file_path.name, fields, triggers)
+            if analysis_result["send_reason"] != "N/A":
+                log.info("   - '%s' is a PASS report, but will be sent. Reason: %s.",
+                         file_path.name, analysis_result['send_reason'])
+                report['classification'] = 'SEND'
+                return report
+
+        log.info("   - '%s' is a standard PASS report. It will be skipped.", file_path.name)
+        report['classification'] = 'REVIEW'
+        return report
+    finally:
+        wb.close()
+
+
+@dataclass
+class HandlerStats:
+    """Counters returned by the handler run() methods.
+
+    Each handler fills only the fields it owns; the full process merges the
+    per-batch stats so the summary never has to re-enumerate the files.
+    """
+    processed: int = 0
+    rows_entered: int = 0
+    drafts_created: int = 0
+    reviewed: int = 0
+    organized: int = 0
+    report_data: Dict[Path, Dict] = field(default_factory=dict)
+
+    def merge(self, other: 'HandlerStats') -> None:
+        """Accumulates another batch's counters into this one."""
+        self.processed += other.processed
+        self.rows_entered += other.rows_entered
+        self.drafts_created += other.drafts_created
+        self.reviewed += other.reviewed
+        self.organized += other.organized
+        self.report_data.update(other.report_data)
+
+
+# =============================================================================
+#   TASK 1: Data Entry Handler
+# =============================================================================
+
+class DataEntryHandler:
+    """Handles the data entry task into the main Excel workbook using xlwings to preserve shapes."""
+
+    def __init__(self, config: ConfigLoader):
+        self.config = config
+        self.main_file_path = Path(config.get('paths.main_workbook'))
+        self.backup_dir = Path(config.get('paths.main_workbook_backup'))
+        self.mappings = config.get('mappings_data_entry')
+        self.summary_mapping = self.mappings.get('summary_mapping', {})
+        self.defect_mapping = self.mappings.get('defect_mapping', {})
+        # Normalized once here; the per-file workers look defect names up in
+        # this map instead of rebuilding it for every file. The interned keys
+        # match the interned lookups in the extraction loop.
+        self.normalized_defect_mapping = {sys.intern(k.lower().strip()): v
+                                          for k, v in self.defect_mapping.items()}
+        self.table_name = self.mappings.get('target_table_name', 'Table13')
+        self.cell_map = config.get('cell_map_organization')
+
+    def _clear_serial_numbers(self, ws):
+        """Clears the serial number column of the target table before data entry."""
+        try:
+            table_ref = ws.api.ListObjects(self.table_name).Range.Address
+            if not table_ref:
+                log.warning("Table '%s' not found. Could not clear serial numbers.", self.table_name)
+                return
+
+            log.info("Clearing serial number column ('C') of the table...")
+            table_range = ws.range(table_ref)
+            sl_no_column_range = table_range.columns[2].offset(row_offset=1).resize(row_size=table_range.rows.count - 1)
+            sl_no_column_range.clear_contents()
+            log.info("Serial number column cleared successfully.")
+        except Exception as e:
+            log.error("Error while clearing serial numbers: %s", e)
+
+    def run(self, source_files_list: Iterable[Path]) -> HandlerStats:
+        """Executes the data entry process using xlwings to preserve file integrity."""
+        log.info("=" * 50 + "\nTASK 1: Starting Data Entry into Main Workbook...\n" + "=" * 50)
+        # Pull the first file eagerly so an empty iterable is still detected,
+        # then stream the rest straight into the pool: extraction of early
+        # files overlaps discovery of later ones when a generator is passed.
+        files_iter = iter(source_files_list)
+        first = next(files_iter, None)
+        if first is None:
+            log.warning("No files found for data entry.")
+            return HandlerStats()
+
+        log.info("Collecting and sorting data from files...")
+        worker = partial(_data_entry_worker, summary_mapping=self.summary_mapping,
+                         normalized_defect_mapping=self.normalized_defect_mapping, cell_map=self.cell_map)
+        with ProcessPoolExecutor(initializer=_init_worker_logging) as executor:
+            results = list(executor.map(worker, chain([first], files_iter), chunksize=4))
+        stats = HandlerStats(processed=len(results))
+        all_data_to_enter = [r for r in results if r]
+
+        sorted_data = sorted(all_data_to_enter, key=itemgetter(0))
+        log.info("Data sorted successfully.")
+
+        if not self.main_file_path.is_file():
+            log.error("Main workbook not found at: '%s'", self.main_file_path)
+            return stats
+
+        excel_app = None
+        # Off the main thread _shared_excel_app hands out a private instance
+        # (the shared one is bound to the main thread's COM apartment), which
+        # this run then owns and must shut down.
+        owns_app = threading.current_thread() is not threading.main_thread()
+        try:
+            excel_app = _shared_excel_app()
+            # Suspend repaint, events, and recalculation for the write phase;
+            # Excel otherwise recalculates and redraws after every range write.
+            excel_app.api.ScreenUpdating = False
+            excel_app.api.EnableEvents = False
+            excel_app.api.Calculation = xw.constants.Calculation.xlCalculationManual
+            target_workbook = excel_app.books.open(self.main_file_path)
+            ws = target_workbook.sheets["Data Analysis report"]
+
+            self._clear_serial_numbers(ws)
+
+            table_ref = ws.api.ListObjects(self.table_name).Range.Address
+            if not table_ref:
+                log.error("Target table '%s' not found. Cannot perform data entry.", self.table_name)
+                return stats
+
+            table_range = ws.range(table_ref)
+            invoice_col = table_range.columns[5]  # Column F
+            scan_range = invoice_col.offset(row_offset=1).resize(row_size=table_range.rows.count - 1 + 500)
+            # One bulk COM read of the whole column instead of one round-trip per cell.
+            col_values = scan_range.value
+            if not isinstance(col_values, list):
+                col_values = [col_values]
+            first_empty_idx = next((i for i, v in enumerate(col_values) if v is None), None)
+
+            next_row = scan_range.row + first_empty_idx if first_empty_idx is not None else ws.cells.last_cell.row + 1
+            if next_row < 181: next_row = 181
+
+            log.info("Data entry will start from row %s.", next_row)
+            if sorted_data:
+                # Every ws.range(...).value assignment is a COM round-trip, so the rows
+                # are written as 2-D blocks. The mapped columns are grouped into
+                # contiguous runs first: columns in between (e.g. table formulas)
+                # must not be overwritten with blanks.
+                col_indices = sorted({column_index_from_string('C')} |
+                                     {column_index_from_string(c) for _, entry, _name in sorted_data for c in entry})
+                column_runs = []
+                run_start = prev_idx = col_indices[0]
+                for idx in col_indices[1:]:
+                    if idx != prev_idx + 1:
+                        column_runs.append((run_start, prev_idx))
+                        run_start = idx
+                    prev_idx = idx
+                column_runs.append((run_start, prev_idx))
+
+                rows_by_index = []
+                for sl_no_counter, (_sort_keys, entry, file_name) in enumerate(sorted_data, start=1):
+                    log.info("   -> Writing data for: %s", file_name)
+                    row_map = {column_index_from_string(c): v for c, v in entry.items()}
+                    row_map[column_index_from_string('C')] = sl_no_counter
+                    rows_by_index.append(row_map)
+
+                last_row = next_row + len(sorted_data) - 1
+                for run_start, run_end in column_runs:
+                    matrix = [[row_map.get(idx) for idx in range(run_start, run_end + 1)]
+                              for row_map in rows_by_index]
+                    address = f'{get_column_letter(run_start)}{next_row}:{get_column_letter(run_end)}{last_row}'
+                    try:
+                        ws.range(address).value = matrix
+                    except Exception as block_error:
+                        log.warning("Could not write block %s: %s", address, block_error)
+
+            # One full recalculation before saving instead of one per write.
+            excel_app.api.Calculate()
+            target_workbook.save()
+            log.info("Data entry completed successfully!")
+
+            try:
+                self.backup_dir.mkdir(exist_ok=True)
+                backup_path = self.backup_dir / self.main_file_path.name
+                _fast_copy(self.main_file_path, backup_path)
+                log.info("A backup of the main file was successfully created at '%s'.", backup_path)
+            except Exception as backup_error:
+                log.error("Error creating backup: %s", backup_error)
+
+            stats.rows_entered = len(sorted_data)
+            return stats
+        except Exception as e:
+            log.error("An unexpected error occurred during data entry: %s", e, exc_info=True)
+            return stats
+        finally:
+            if excel_app:
+                try:
+                    excel_app.api.Calculation = xw.constants.Calculation.xlCalculationAutomatic
+                    excel_app.api.EnableEvents = True
+                    excel_app.api.ScreenUpdating = True
+                except Exception:
+                    pass
+                # Close the workbooks; the main thread's shared instance stays
+                # warm for the next run (shut down once at interpreter exit),
+                # while a private worker-thread instance must die with its
+                # apartment.
+                for book in excel_app.books:
+                    book.close()
+                if owns_app:
+                    try:
+                        excel_app.quit()
+                    except Exception:
+                        pass
+
+
+# =============================================================================
+#   TASK 2: Emailer
+# =============================================================================
+
+class Emailer:
+    """Handles email creation and drafting with advanced data analysis."""
+
+    def __init__(self, config: ConfigLoader):
+        self.config = config
+        self.cell_map = config.get('cell_map_organization')
+        self.email_settings = config.get('email_settings')
+        self.triggers = config.get('email_filter_rules.pass_report_triggers', {})
+        self.review_folder = Path(config.get('paths.manual_review'))
+        self.primary_recipient = self.email_settings.get('primary_recipient')
+        self.secondary_recipient = self.email_settings.get('secondary_recipient')
+        # Attach files as links (olByReference) instead of copying them into the
+        # Outlook store. Much faster, but only valid while drafts stay on this
+        # machine, so it is opt-in from master.json.
+        self.attach_by_reference = bool(self.email_settings.get('attach_by_reference', False))
+
+    def _generate_email_body(self, buyer: str, supplier: str, reports: List[Dict]) -> str:
+        """Generates the HTML body for the email, grouped by style."""
+        body = f"""
+        <html><head><style>
+            body {{ font-family: Calibri, sans-serif; font-size: 11pt; }}
+            .fail-text {{ color: red; font-weight: bold; }}
+            .pass-text {{ color: green; }}
+            .container {{ margin-bottom: 8px; }}
+            .icon {{ font-size: 1.1em; }}
+        </style></head><body>
+            <p>Dear Concern,</p>
+            <p>Please find the attached Fabric Inspection Report(s). The summary is mentioned below:</p>
+            <p style="margin: 0;"><b>Buyer:</b> {buyer}</p>
+            <p style="margin: 10px 0;"><b>Supplier:</b> {supplier}</p><hr>
+        """
+
+        reports_by_style = defaultdict(list)
+        for r in reports:
+            reports_by_style[r.get('style', 'N/A')].append(r)
+
+        for style, style_reports in reports_by_style.items():
+            body += f'<p style="margin-top: 15px; margin-bottom: 5px;"><b>Style:</b> {style}</p>'
+            body += '<div style="margin-top: 5px; padding-left: 25px;">'
+            for report in style_reports:
+                result = report.get('result', 'N/A')
+                comment = report.get('comment', '')
+                result_class = "fail-text" if any(w in result.lower() for w in ['fail', 'rejected']) else "pass-text"
+                reason_text = f"Due to: {comment}" if comment else ""
+
+                body += f"""
+                <div class="container">
+                    <span class="icon">➢</span> 
+                    <b>{report.get('color', 'N/A')}</b> ({report.get('rolls', 'N/A')} Rolls): 
+                    <span class="{result_class}">{result.upper()}</span> {reason_text}
+                </div>"""
+            body += "</div>"
+
+        body += "<br><p>Thanks.</p><p>Best Regards,<br>Chanchol Roy<br>QED Department</p></body></html>"
+        return body
+
+    def run(self, source_files_list: Iterable[Path]) -> HandlerStats:
+        """Executes the email automation, drafts emails, and copies review files.
+
+        The returned stats carry the draft and review counts plus the
+        extracted report data keyed by path, so the file organizer can reuse
+        it instead of parsing the same workbooks again.
+        """
+        log.info("=" * 50 + "\nTASK 2: Starting Email Automation...\n" + "=" * 50)
+        files_iter = iter(source_files_list)
+        first = next(files_iter, None)
+        if first is None:
+            log.warning("No files found to email.")
+            return HandlerStats()
+
+        self.review_folder.mkdir(exist_ok=True)
+
+        worker = partial(_email_report_worker, cell_map=self.cell_map, triggers=self.triggers)
+        with ProcessPoolExecutor(initializer=_init_worker_logging) as executor:
+            results = list(executor.map(worker, chain([first], files_iter), chunksize=4))
+        all_reports = [r for r in results if r]
+
+        report_data = {r['file_path']: r for r in all_reports}
+        stats = HandlerStats(processed=len(results), report_data=report_data)
+        reports_to_send = [r for r in all_reports if r['classification'] == 'SEND']
+        reports_to_review = [r for r in all_reports if r['classification'] == 'REVIEW']
+
+        log.info("Found a total of %s reports. Advanced filtering finished.", len(all_reports))
+
+        reviewed_count = 0
+        for report in reports_to_review:
+            try:
+                _fast_copy(report['file_path'], self.review_folder / report['file_path'].name)
+                reviewed_count += 1
+            except Exception as e:
+                log.error("Failed to COPY '%s' to review folder: %s", report['file_path'].name, e)
+        if reviewed_count > 0:
+            log.info("%s standard PASS report(s) were COPIED to Manual Review.", reviewed_count)
+        stats.reviewed = reviewed_count
+
+        if not reports_to_send:
+            log.info("Filtering complete. No critical reports found to be sent via email.")
+            return stats
+
+        log.info("Filtering complete. %s email drafts will be created.", len(reports_to_send))
+        grouped_reports = defaultdict(list)
+        for report in reports_to_send:
+            grouped_reports[(report.get('buyer', 'N/A'), report.get('supplier', 'N/A'))].append(report)
+
+        # Composition (HTML body building) is plain Python and threadsafe,
+        # while saving a draft is a chain of Outlook COM round-trips bound to
+        # one apartment. Pipeline them: compose workers feed a bounded queue,
+        # a single committer thread drains it, so draft N+1 is being built
+        # while draft N is still round-tripping through COM.
+        payload_queue: 'queue.Queue[Optional[Dict]]' = queue.Queue(maxsize=16)
+
+        def commit_worker() -> int:
+            pythoncom.CoInitialize()
+            count = 0
+            try:
+                try:
+                    outlook = win32.DispatchEx('outlook.application')
+                    drafts_folder = outlook.GetNamespace('MAPI').GetDefaultFolder(16)  # 16 = olFolderDrafts
+                except Exception as e:
+                    log.error("Failed to connect to Outlook: %s", e)
+                    log.error("Please ensure the Outlook application is running.")
+                    while payload_queue.get() is not None:  # unblock producers
+                        pass
+                    return 0
+                while True:
+                    payload = payload_queue.get()
+                    if payload is None:
+                        return count
+                    try:
+                        self.commit_draft(drafts_folder, payload)
+                        count += 1
+                        log.info("Successfully saved email draft for '%s' with %d attachment(s).",
+                                 payload['recipient'], len(payload['attachments']))
+                    except Exception as e:
+                        log.error("Failed to save email draft using Outlook: %s", e)
+            finally:
+                pythoncom.CoUninitialize()
+
+        with ThreadPoolExecutor(max_workers=1) as committer:
+            commit_future = committer.submit(commit_worker)
+            try:
+                with ThreadPoolExecutor(max_workers=4) as composers:
+                    payloads = composers.map(
+                        lambda item: self.build_draft_payload(item[0][0], item[0][1], item[1]),
+                        grouped_reports.items())
+                    for payload in payloads:
+                        payload_queue.put(payload)
+            finally:
+                payload_queue.put(None)
+            stats.drafts_created = commit_future.result()
+        return stats
+
+    def build_draft_payload(self, buyer: str, supplier: str, reports: List[Dict]) -> Dict:
+        """Composes everything a draft needs without touching COM."""
+        has_fail_report = any(
+            'fail' in r.get('result', '').lower() or 'rejected' in r.get('result', '').lower() for r in reports)
+        recipient = self.primary_recipient if has_fail_report else self.secondary_recipient
+        consignments = sorted(list({r.get('consignment', '') for r in reports if r.get('consignment', '')}))
+        subject = f"{buyer} # {', '.join(consignments)} Rolls consignment Fabric Inspection Status"
+        return {
+            'recipient': recipient,
+            'subject': subject,
+            'body': self._generate_email_body(buyer, supplier, reports),
+            'attachments': [str(r['file_path']) for r in reports],
+        }
+
+    def commit_draft(self, drafts_folder, payload: Dict) -> None:
+        """Creates and saves one Outlook draft; must run on the COM thread."""
+        mail = drafts_folder.Items.Add('IPM.Note')
+        mail.To = payload['recipient']
+        mail.Subject = payload['subject']
+        mail.HTMLBody = payload['body']
+        for attachment in payload['attachments']:
+            if self.attach_by_reference:
+                try:
+                    mail.Attachments.Add(Source=attachment, Type=5)  # 5 = olByReference
+                    continue
+                except Exception as attach_error:
+                    log.warning("By-reference attach failed for '%s', embedding instead: %s", attachment, attach_error)
+            mail.Attachments.Add(attachment)
+        mail.Save()
+
+
+# =============================================================================
+#   TASK 3: File Organizer
+# =============================================================================
+
+class FileOrganizer:
+    """Handles file organization and cleanup of empty directories."""
+
+    def __init__(self, config: ConfigLoader):
+        self.config = config
+        self.source_dir = Path(config.get('paths.pending_reports'))
+        self.output_dir = Path(config.get('paths.ongoing_work'))
+        self.error_dir = self.source_dir.parent / "Error Reports"
+        self.cell_map = config.get('cell_map_organization')
+
+    def _clean_name(self, name: Any) -> str:
+        """Cleans a string to be used as a valid file/folder name."""
+        return _INVALID_NAME_CHARS.sub('', str(name or '').strip())
+
+    def _format_date(self, date_value: Any) -> str:
+        """Formats a date value into a specific string format."""
+        if isinstance(date_value, datetime):
+            return date_value.strftime("(%d-%m-%y)")
+        try:
+            return pd.to_datetime(date_value).strftime("(%d-%m-%y)")
+        except (ValueError, TypeError):
+            return f"({self._clean_name(date_value)})"
+
+    def _cleanup_empty_dirs(self, path: Path):
+        """Recursively deletes empty subdirectories."""
+        # os.scandir reports is_dir() from the directory entry itself, so the
+        # walk costs one readdir per directory instead of a stat per file.
+        stack = [str(path)]
+        subdirs = []
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                            subdirs.append(entry.path)
+            except OSError:
+                continue
+        # Parents were discovered before their children, so reversed order
+        # removes the deepest folders first and lets empty chains collapse.
+        for dirpath in reversed(subdirs):
+            try:
+                os.rmdir(dirpath)
+                log.info("   -> Cleaned up empty folder: %s", dirpath)
+            except OSError:
+                pass  # Directory is not empty
+
+    def run(self, source_files_list: Iterable[Path], report_data: Optional[Dict[Path, Dict]] = None) -> HandlerStats:
+        """Executes the file organization process.
+
+        When the emailer already extracted data for a file in this run, its
+        dict is reused via report_data; only files that bypassed Task 2 are
+        parsed again here.
+        """
+        log.info("=" * 50 + "\nTASK 3: Starting File Organization...\n" + "=" * 50)
+        self.error_dir.mkdir(exist_ok=True)
+        self.output_dir.mkdir(exist_ok=True)
+
+        files_iter = iter(source_files_list)
+        first = next(files_iter, None)
+        if first is None:
+            log.warning("No files to organize.")
+            return HandlerStats()
+
+        report_data = report_data or {}
+        stats = HandlerStats()
+        organized_count = 0
+        # Each move is mostly syscall latency (mkdir + rename, worse over
+        # SMB), so a few threads overlap them; files are independent and the
+        # destination mkdir is exist_ok, making organize_one safe to overlap.
+        worker_count = min(8, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=worker_count) as pool:
+            results = pool.map(lambda fp: self.organize_one(fp, report_data.get(fp)),
+                               chain([first], files_iter))
+            for moved in results:
+                stats.processed += 1
+                if moved:
+                    organized_count += 1
+
+        log.info("\nCleaning up empty source folders...")
+        self._cleanup_empty_dirs(self.source_dir)
+        log.info("File organization completed.")
+        stats.organized = organized_count
+        return stats
+
+    def organize_one(self, file_path: Path, pipelined: Optional[Dict] = None) -> bool:
+        """Renames and moves a single report; returns True when it was filed.
+
+        Thread-safe with respect to other files: failures land in the Error
+        folder exactly as in the serial flow.
+        """
+        if not file_path.exists():
+            return False
+
+        try:
+            log.info("\n[*] Organizing file: %s", file_path.name)
+            if pipelined is not None:
+                data = {key: self._clean_name(pipelined.get(key)) for key in self.cell_map if
+                        key != 'sheet_name'}
+                date_val = pipelined.get('raw_date')
+                consignment_val = pipelined.get('raw_consignment')
+                rolls_val = pipelined.get('raw_rolls')
+            else:
+                fields = _read_summary_cells(file_path, self.cell_map)
+                data = {key: self._clean_name(value) for key, value in fields.items()}
+                date_val = fields.get('date')
+                consignment_val = fields.get('consignment')
+                rolls_val = fields.get('rolls')
+
+            data['date'] = self._format_date(date_val)
+
+            try:
+                data['consignment'] = self._clean_name(int(safe_float(consignment_val)))
+            except (ValueError, TypeError):
+                data['consignment'] = self._clean_name(consignment_val)
+
+            try:
+                data['rolls'] = self._clean_name(int(safe_float(rolls_val)))
+            except (ValueError, TypeError):
+                data['rolls'] = self._clean_name(rolls_val)
+
+            if not all([data['buyer'], data['supplier'], data['consignment']]):
+                raise ValueError("Missing required info: Buyer, Supplier, or Consignment.")
+
+            folder_name = f"CON-{data['consignment']} {data['date']}"
+            destination_folder = self.output_dir / data['buyer'] / folder_name
+            destination_folder.mkdir(parents=True, exist_ok=True)
+
+            new_filename = f"{data['style']}, COLOR-{data['color']}, Roll-{data['rolls']}, {data['fabric_code']}{file_path.suffix}"
+            final_path = destination_folder / new_filename
+
+            _fast_move(file_path, final_path)
+            log.info("   [✓] Successfully MOVED to '%s'.", final_path.relative_to(self.output_dir.parent))
+            return True
+        except Exception as e:
+            log.error("   [X] Error organizing '%s': %s", file_path.name, e)
+            try:
+                _fast_move(file_path, self.error_dir / file_path.name)
+            except Exception as move_error:
+                log.error("Could not even move to Error folder: %s", move_error)
+            return False
+
+
+# ==========================================================
+#                         Main Driver
+# ==========================================================
+
+class AutomationSystem:
+    """Manages the entire automation workflow."""
+
+    # Organizer files handled per progress-bar tick in the full process.
+    BATCH_SIZE = 100
+
+    # Fixed console strings, assembled once at class definition instead of
+    # being re-multiplied and re-joined on every display.
+    _MENU_RULE = "=" * 60
+    _MENU_TEXT = "\n".join([
+        "",
+        _MENU_RULE,
+        "    DEBONAIR GROUP - Quality Automation System (v17.4)",
+        "    Created by Chanchol Roy",
+        _MENU_RULE,
+        "Which task would you like to perform? Please enter a number:",
+        "  1. Run Full Process (Data Entry -> Email -> Organize)",
+        "  2. Only Data Entry",
+        "  3. Only Create Email Drafts",
+        "  4. Only Organize Files",
+        "  0. Exit Program",
+        _MENU_RULE,
+        "",
+    ])
+    _SUMMARY_RULE = "-" * 25 + " ACTION SUMMARY " + "-" * 25
+    _SUMMARY_END = "-" * 68
+
+    def __init__(self):
+        setup_logging()
+        self.config = ConfigLoader(file_path="master.json")
+
+        self.pending_path = Path(self.config.get('paths.pending_reports'))
+        self.ongoing_path = Path(self.config.get('paths.ongoing_work'))
+        self._prefetch: Dict[Path, Any] = {}
+
+    # The handlers are built lazily on first use so that, for example, picking
+    # option 4 never pays for the data-entry or email setup. The config stays
+    # eager because it is cheap and every handler shares it.
+    @cached_property
+    def data_entry_handler(self) -> 'DataEntryHandler':
+        return DataEntryHandler(self.config)
+
+    @cached_property
+    def emailer(self) -> 'Emailer':
+        return Emailer(self.config)
+
+    @cached_property
+    def file_organizer(self) -> 'FileOrganizer':
+        return FileOrganizer(self.config)
+
+    def _kick_prefetch(self):
+        """Starts background scans of both working folders.
+
+        The user spends a few seconds reading the menu or summary; scanning
+        meanwhile means the next task usually finds its file list waiting.
+        """
+        for path in (self.pending_path, self.ongoing_path):
+            future = self._prefetch.get(path)
+            if future is None or future.done():
+                self._prefetch[path] = _scan_pool.submit(get_excel_files_cached, path)
+
+    def _prompt(self, message: str) -> str:
+        """Blocks on input() after kicking off folder scans in the background."""
+        self._kick_prefetch()
+        return input(message)
+
+    def _scan_with_prefetch(self, target_path: Path) -> List[Path]:
+        """Uses a finished background scan when available, else scans live."""
+        future = self._prefetch.pop(target_path, None)
+        if future is not None:
+            try:
+                return future.result(timeout=0)
+            except Exception:
+                pass
+        return get_excel_files_cached(target_path)
+
+    @staticmethod
+    def _run_com_task(task, *args):
+        """Runs a handler on a worker thread inside its own COM apartment."""
+        pythoncom.CoInitialize()
+        try:
+            return task(*args)
+        finally:
+            pythoncom.CoUninitialize()
+
+    def _display_menu(self):
+        """Displays the main menu to the user."""
+        # One buffered write instead of a dozen print() calls; each print is
+        # its own syscall, which adds up on slow consoles and SSH sessions.
+        sys.stdout.write(self._MENU_TEXT)
+        sys.stdout.flush()
+
+    def _get_files_for_task(self, task_name: str) -> Optional[List[Path]]:
+        """Asks the user to choose a folder and returns the files from it."""
+        print(f"\nFor the '{task_name}' task, which folder do you want to use?")
+        print("  1. Pending Reports")
+        print("  2. Ongoing Work")
+        folder_choice = self._prompt("Your choice (1 or 2): ").strip()
+
+        if folder_choice == '1':
+            target_path = self.pending_path
+        elif folder_choice == '2':
+            target_path = self.ongoing_path
+        else:
+            print("❌ Invalid choice. Please enter 1 or 2.")
+            return None
+
+        files = self._scan_with_prefetch(target_path)
+        if not files:
+            log.error("No Excel files found in the '%s' folder.", target_path.name)
+            return None
+        return files
+
+    def _read_menu_choice(self) -> str:
+        """Reads the menu selection as a single keypress where supported.
+
+        On a Windows console one key is enough (no Enter needed); elsewhere,
+        or when stdin is redirected, it falls back to the classic input().
+        """
+        if msvcrt is not None and sys.stdin.isatty():
+            self._kick_prefetch()
+            sys.stdout.write("Your choice: ")
+            sys.stdout.flush()
+            key = msvcrt.getwch()
+            sys.stdout.write(key + "\n")
+            return key.strip()
+        return self._prompt("Your choice: ").strip()
+
+    def _run_full(self):
+        """Option 1: Data Entry -> Email -> Organize over the pending folder."""
+        files_in_pending = self._scan_with_prefetch(self.pending_path)
+        if not files_in_pending:
+            log.error("Cannot run the full process because the '%s' folder is empty.",
+                      self.pending_path.name)
+            return
+
+        # pre-scanned: the handlers consume this list verbatim and never
+        # re-enumerate the folder themselves; a tuple keeps it immutable
+        # while shared across the worker threads.
+        initial_files = tuple(files_in_pending)
+        log.debug("reusing %d pre-scanned files", len(initial_files))
+        organize_totals = HandlerStats()
+
+        # Data entry and email drafting each see the whole run exactly once:
+        # data entry clears the serial column and numbers rows from 1, and
+        # the emailer groups drafts by buyer/supplier, so slicing either of
+        # them would corrupt serials and fragment drafts. Their process
+        # pools already bound memory by streaming the input.
+        #
+        # Data entry (Excel COM) and email drafting (Outlook COM plus the
+        # extraction pool) touch different applications and only read the
+        # source files, so they overlap in worker threads. Organizing must
+        # wait: it moves the files the other two read.
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            entry_future = pool.submit(self._run_com_task, self.data_entry_handler.run, initial_files)
+            email_future = pool.submit(self._run_com_task, self.emailer.run, initial_files)
+            entry_stats = entry_future.result()
+            email_stats = email_future.result()
+
+        # Organizing is independent per file, so it runs in batches purely
+        # to drive the progress bar at a useful granularity.
+        batches = [initial_files[i:i + self.BATCH_SIZE]
+                   for i in range(0, len(initial_files), self.BATCH_SIZE)]
+        pbar = (tqdm(total=len(initial_files), unit="file", desc="Organizing")
+                if HAS_TQDM else None)
+        try:
+            for batch in batches:
+                organize_totals.merge(self.file_organizer.run(batch, email_stats.report_data))
+                if pbar:
+                    pbar.update(len(batch))
+        finally:
+            if pbar:
+                pbar.close()
+            _scan_cached.cache_clear()
+
+        # Every count comes from the handler stats themselves, so nothing
+        # here needs to re-measure the input sequence.
+        summary = "\n".join([
+            "",
+            self._SUMMARY_RULE,
+            f"  - Initial Files Found: {entry_stats.processed}",
+            f"  - Rows Entered: {entry_stats.rows_entered}",
+            f"  - Email Drafts Created: {email_stats.drafts_created}",
+            f"  - Files Copied to Review: {email_stats.reviewed}",
+            f"  - Files Organized: {organize_totals.organized}",
+            self._SUMMARY_END,
+            "",
+        ])
+        sys.stdout.write(summary)
+        sys.stdout.flush()
+
+    def _run_data_entry(self):
+        """Option 2: data entry only."""
+        files = self._get_files_for_task("Data Entry")
+        if files:
+            stats = self.data_entry_handler.run(files)
+            print(f"\nSUMMARY: {stats.rows_entered} row(s) were entered into the main workbook.")
+
+    def _run_email_drafts(self):
+        """Option 3: email drafting only."""
+        files = self._get_files_for_task("Email Drafts")
+        if files:
+            stats = self.emailer.run(files)
+            print(f"\nSUMMARY: {stats.drafts_created} email draft(s) were created.")
+            print(f"         {stats.reviewed} file(s) were copied to the Manual Review folder.")
+
+    def _run_organize(self):
+        """Option 4: file organization only."""
+        files = self._get_files_for_task("File Organization")
+        if files:
+            stats = self.file_organizer.run(files)
+            _scan_cached.cache_clear()
+            print(f"\nSUMMARY: {stats.organized} file(s) were organized.")
+
+    def run(self):
+        """Runs the main loop of the automation system."""
+        actions = {
+            '1': self._run_full,
+            '2': self._run_data_entry,
+            '3': self._run_email_drafts,
+            '4': self._run_organize,
+        }
+        while True:
+            self._display_menu()
+            choice = self._read_menu_choice()
+
+            if choice == '0':
+                print("Exiting program. Goodbye!")
+                break
+
+            action = actions.get(choice)
+            if action is not None:
+                action()
+            else:
+                print("❌ Invalid input. Please enter a number between 0 and 4.")
+
+            self._prompt("\nPress Enter to return to the main menu...")
+
+
+if __name__ == "__main__":
+    try:
+        system = AutomationSystem()
+        system.run()
+    except Exception as e:
+        log.critical("A critical error occurred while running the program: %s", e, exc_info=True)
+        input("\nPress Enter to exit the program...")
+